@@ -1,33 +1,45 @@
+from functools import lru_cache
+
+import numpy as np
 import streamlit as st
 
-from data_loader import load_type_chart, effectiveness, load_moves, load_pokemon
+from data_loader import load_type_chart, load_moves, load_pokemon, type_pair, TYPE_NAMES
 from inference import forward_chain
-from kb import rules
+from kb import compiled_rules, move_columns, scored_moves
+from scoring import score_moves_kernel, type_rows
 
 
 # ========================
 # Carga de datos (cacheada)
 # ========================
+# cache_resource devuelve siempre el mismo objeto, sin copiarlo en cada
+# rerun: lo que devuelven estas funciones no debe modificarse.
 
-@st.cache_data
+@st.cache_resource
 def get_type_chart():
     return load_type_chart()
 
 
-@st.cache_data
+@st.cache_resource
 def get_moves_db():
     return load_moves()
 
 
-@st.cache_data
+@st.cache_resource
 def get_pokemon_db():
     return load_pokemon()
 
 
+@st.cache_resource
+def get_rules():
+    return compiled_rules()  # compiladas una vez a partir de kb.RULES
+
+
 # ========================
 # Funciones auxiliares
 # ========================
 
+@lru_cache(maxsize=4096)
 def normalize_identifier(name: str) -> str:
     """
     Convierte 'Mr Mime' -> 'mr-mime' (formato veekun aproximado).
@@ -35,76 +47,90 @@ def normalize_identifier(name: str) -> str:
     return name.strip().lower().replace(" ", "-")
 
 
+def type_names(type_ids):
+    """
+    Nombres de una lista de ids de tipo, solo para mostrarlos.
+    """
+    return [TYPE_NAMES[t] for t in type_ids]
+
+
 def get_pokemon_types(name: str, pokemon_db):
     """
-    Devuelve (identifier, [types]) a partir del nombre.
-    Si no se encuentra, devuelve (identifier, []).
+    Devuelve (identifier, (ids de tipo)) a partir del nombre.
+    Si no se encuentra, devuelve (identifier, ()).
     """
     identifier = normalize_identifier(name)
     info = pokemon_db.get(identifier)
     if info:
         return identifier, info["types"]
     else:
-        return identifier, []
+        return identifier, ()
 
 
 def has_type_advantage(attacking_types, defending_types, chart) -> bool:
     """
     Devuelve True si alguno de tus tipos hace más de x1 contra la combinación del rival.
+    Es una lectura de la tabla precalculada chart.dual_advantage.
     """
-    if not attacking_types or not defending_types:
-        return False
-
-    best = 1.0
-    for t in attacking_types:
-        eff = effectiveness(t, defending_types, chart)
-        if eff > best:
-            best = eff
-    return best > 1.0   # ventaja si hay algún ataque > x1
+    return bool(chart.dual_advantage[type_pair(attacking_types) + type_pair(defending_types)])
 
 
-def build_moves(moves_db, my_types, enemy_types, chart):
+def collect_move_names():
     """
-    Construye la lista de movimientos a partir de los nombres introducidos en Streamlit.
-    Requiere que los movimientos existan en la base veekun.
+    Muestra los 4 campos de movimiento y devuelve los nombres no vacíos.
+    Solo widgets: la puntuación se hace aparte en score_moves.
     """
-    my_moves = []
-
+    names = []
     for i in range(1, 5):
         raw_name = st.text_input(
             f"Movimiento {i} (identifier veekun, ej: flamethrower, water-gun, thunderbolt)",
             key=f"mv{i}"
         )
         raw_name = raw_name.strip()
-        if not raw_name:
-            continue
+        if raw_name:
+            names.append(raw_name)
+    return tuple(names)
 
-        key = normalize_identifier(raw_name)
-        db_mv = moves_db.get(key)
-
-        if not db_mv:
-            st.warning(f"El movimiento '{raw_name}' no se ha encontrado en la base veekun. "
-                       f"Revisa el nombre o déjalo vacío si no lo necesitas.")
-            continue
-
-        mv_type = db_mv["type"]
-        power = db_mv["power"] if db_mv["power"] is not None else 60
 
-        eff = effectiveness(mv_type, enemy_types, chart) if enemy_types else 1.0
-        score = eff * power
-        if mv_type in my_types:
-            score *= 1.2  # bonus por STAB
+@st.cache_data
+def score_moves(names, my_types, enemy_types):
+    """
+    Construye la lista de movimientos a partir de los nombres introducidos.
+    Requiere que los movimientos existan en la base veekun.
+    Devuelve (movimientos, los mismos en columnas (ver kb.compute_best_move),
+    nombres no encontrados).
+    Cacheada: en los reruns con las mismas entradas no se vuelve a puntuar.
+    """
+    moves_db = get_moves_db()
+    chart = get_type_chart()
+    collected = []
+    missing = []
 
-        my_moves.append({
-            "name": raw_name,      # como lo ve el usuario
-            "identifier": key,     # formato veekun
-            "type": mv_type,
-            "power": power,
-            "eff": eff,
-            "score": score,
-        })
+    for raw_name in names:
+        key = normalize_identifier(raw_name)
+        row = moves_db.index.get(key)
+        if row is None:
+            missing.append(raw_name)
+            continue
 
-    return my_moves
+        power = int(moves_db.power[row])
+        power = 60 if power < 0 else power
+        collected.append((raw_name, key, int(moves_db.type_idx[row]), power))
+
+    if not collected:
+        return [], None, missing
+
+    # Puntuación de todos los movimientos de una vez (un único emparejamiento)
+    mv_type_idx, powers = move_columns(collected)
+    eff, score = score_moves_kernel(
+        mv_type_idx,
+        type_rows([enemy_types]),
+        powers,
+        type_rows([my_types]),
+        chart.matrix,
+    )
+    my_moves, moves_soa = scored_moves(collected, eff[0], score[0])
+    return my_moves, moves_soa, missing
 
 
 # ========================
@@ -116,7 +142,6 @@ def main():
     st.write("Introduce la situación del combate y el sistema experto te recomendará la mejor acción.")
 
     chart = get_type_chart()
-    moves_db = get_moves_db()
     pokemon_db = get_pokemon_db()
 
     st.header("1) Datos de los Pokémon")
@@ -127,7 +152,7 @@ def main():
         my_raw_name = st.text_input("Nombre de tu Pokémon (ej: charizard, pikachu)", value="charizard")
         my_identifier, my_types = get_pokemon_types(my_raw_name, pokemon_db)
         if my_types:
-            st.success(f"{my_identifier} encontrado. Tipos: {my_types}")
+            st.success(f"{my_identifier} encontrado. Tipos: {type_names(my_types)}")
         else:
             st.error("Tu Pokémon no se ha encontrado en la base. Algunas reglas pueden no activarse.")
 
@@ -135,7 +160,7 @@ def main():
         enemy_raw_name = st.text_input("Nombre del Pokémon enemigo (ej: blastoise, venusaur)", value="blastoise")
         enemy_identifier, enemy_types = get_pokemon_types(enemy_raw_name, pokemon_db)
         if enemy_types:
-            st.success(f"{enemy_identifier} encontrado. Tipos: {enemy_types}")
+            st.success(f"{enemy_identifier} encontrado. Tipos: {type_names(enemy_types)}")
         else:
             st.error("El Pokémon enemigo no se ha encontrado en la base. Algunas reglas pueden no activarse.")
 
@@ -146,7 +171,11 @@ def main():
 
     st.header("3) Movimientos de tu Pokémon")
     st.caption("Usa los nombres en formato veekun. Ejemplos: **flamethrower**, **water-gun**, **vine-whip**, **thunderbolt**.")
-    my_moves = build_moves(moves_db, my_types, enemy_types, chart)
+    move_names = collect_move_names()
+    my_moves, my_moves_soa, missing_moves = score_moves(move_names, tuple(my_types), tuple(enemy_types))
+    for raw_name in missing_moves:
+        st.warning(f"El movimiento '{raw_name}' no se ha encontrado en la base veekun. "
+                   f"Revisa el nombre o déjalo vacío si no lo necesitas.")
 
     st.header("4) Otros factores")
     has_priority_move = st.checkbox("Tengo algún movimiento de prioridad (Quick Attack, ExtremeSpeed, etc.)")
@@ -177,27 +206,28 @@ def main():
             "my_advantage": my_advantage,
             "enemy_advantage": enemy_advantage,
             "my_moves": my_moves,
+            "my_moves_soa": my_moves_soa,
             "has_priority_move": has_priority_move,
             "has_defensive_move": has_defensive_move,
             "is_faster": is_faster,
             "is_slower": is_slower,
         }
 
-        result = forward_chain(facts, rules())
-        recos = sorted(result.facts.get("recommendations", []),
-                       key=lambda r: -r["priority"])
+        result = forward_chain(facts, get_rules())
+        recos = result.facts.get("recommendations", [])  # ya ordenadas
 
         st.subheader("Resumen de la situación")
-        st.write(f"**Tu Pokémon:** {my_identifier}  – tipos: {my_types} – vida: {my_hp_pct}%")
-        st.write(f"**Enemigo:** {enemy_identifier}  – tipos: {enemy_types} – vida: {enemy_hp_pct}%")
+        st.write(f"**Tu Pokémon:** {my_identifier}  – tipos: {type_names(my_types)} – vida: {my_hp_pct}%")
+        st.write(f"**Enemigo:** {enemy_identifier}  – tipos: {type_names(enemy_types)} – vida: {enemy_hp_pct}%")
         st.write(f"Ventaja de tipos tuya: `{my_advantage}`  |  Ventaja del rival: `{enemy_advantage}`")
 
         best = result.facts.get("best_move")
         if best:
             st.subheader("Mejor movimiento según el sistema")
+            best_type = TYPE_NAMES[best.type] if best.type is not None else None
             st.write(
-                f"- **{best['name']}** (tipo `{best['type']}`, poder {best['power']}, "
-                f"efectividad x{best['eff']}, score={best['score']:.1f})"
+                f"- **{best.name}** (tipo `{best_type}`, poder {best.power}, "
+                f"efectividad x{best.eff}, score={best.score:.1f})"
             )
 
         st.subheader("Recomendaciones del sistema experto")
@@ -0,0 +1,19 @@
+"""
+Genera de antemano las cachés de data/.cache (índice SQLite de Pokémon,
+matriz de tipos y movimientos) para que el primer arranque de la app o
+del CLI no tenga que parsear los CSV.
+
+Uso: python src/build_index.py
+"""
+
+from data_loader import build_pokemon_index, load_moves, load_type_chart
+
+
+def main():
+    load_type_chart()
+    load_moves()
+    print(f"Índice de Pokémon: {build_pokemon_index()}")
+
+
+if __name__ == "__main__":
+    main()
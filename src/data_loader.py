@@ -1,138 +1,452 @@
+from collections import defaultdict
+from dataclasses import dataclass, field
+from functools import lru_cache, wraps
+from operator import itemgetter
 from pathlib import Path
-from typing import Dict, List, Any
+from typing import Callable, Dict, Iterator, List, Any, Optional, Sequence, Tuple, Union
 import csv
+import pickle
+import sqlite3
+
+import numpy as np
 
 # Ruta base del proyecto y carpeta data/
 BASE_DIR = Path(__file__).resolve().parent.parent
 DATA_DIR = BASE_DIR / "data"
+CACHE_DIR = DATA_DIR / ".cache"
+# Subir cuando cambie la forma de lo que devuelven los loaders cacheados
+CACHE_VERSION = 4
+
+
+def _column_indices(reader, *columns: str) -> tuple:
+    """
+    Consume la cabecera de un csv.reader y devuelve la posición de cada
+    columna pedida, para indexar las filas por posición.
+    """
+    header = next(reader)
+    idx = {c: i for i, c in enumerate(header)}
+    return tuple(idx[c] for c in columns)
+
+
+@lru_cache(maxsize=1)
+def _pyarrow_csv():
+    """
+    (pyarrow, pyarrow.csv) si está instalado, o None. Lector CSV en C++,
+    opcional: sin él se usa el módulo csv. Se importa solo al parsear, así
+    un arranque con todas las cachés al día no lo carga.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.csv as pacsv
+    except ImportError:
+        return None
+    return pa, pacsv
+
+
+def _read_columns(path: Path, *columns: str) -> Iterator[Tuple[str, ...]]:
+    """
+    Devuelve las filas de un CSV como tuplas de texto con solo las columnas
+    pedidas (las celdas vacías son ""). Usa pyarrow si está instalado.
+    """
+    arrow = _pyarrow_csv()
+    if arrow is not None:
+        pa, pacsv = arrow
+        table = pacsv.read_csv(path, convert_options=pacsv.ConvertOptions(
+            include_columns=list(columns),
+            column_types={c: pa.string() for c in columns},
+            strings_can_be_null=False,
+        ))
+        return zip(*(table.column(c).to_pylist() for c in columns))
+
+    def rows():
+        with path.open(encoding="utf-8") as f:
+            reader = csv.reader(f)
+            getter = itemgetter(*_column_indices(reader, *columns))
+            for row in reader:
+                yield getter(row)
+
+    return rows()
+
+
+def _cached_load(name: str, sources: List[Path], loader: Callable[[], Any]) -> Any:
+    """
+    Devuelve el resultado de `loader()` guardado en data/.cache/<name>.pkl
+    si los CSV de origen no han cambiado (mismo mtime y tamaño).
+    Si no, vuelve a parsear y reescribe la caché.
+    """
+    key = _cache_key(sources)
+    cache_path = CACHE_DIR / f"{name}.pkl"
+
+    try:
+        with cache_path.open("rb") as f:
+            # la clave va en un pickle aparte para no cargar datos obsoletos
+            if pickle.load(f) == key:
+                return pickle.load(f)
+    except Exception:
+        pass  # no existe, está corrupta o es de otra versión del código
+
+    result = loader()
+    try:
+        CACHE_DIR.mkdir(exist_ok=True)
+        tmp_path = cache_path.with_suffix(".tmp")
+        with tmp_path.open("wb") as f:
+            pickle.dump(key, f, protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+        tmp_path.replace(cache_path)
+    except OSError:
+        pass  # sin permisos de escritura: se trabaja sin caché
+
+    return result
+
+
+def _cache_key(sources: List[Path]) -> tuple:
+    """
+    Identifica la versión de los CSV de origen (mtime y tamaño) y del código.
+    """
+    return (CACHE_VERSION,) + tuple(
+        (st.st_mtime_ns, st.st_size) for st in (p.stat() for p in sources)
+    )
+
+
+def _key_matches(key_path: Path, key: tuple) -> bool:
+    """
+    True si el fichero de clave existe y guarda exactamente `key`.
+    """
+    try:
+        with key_path.open("rb") as f:
+            return pickle.load(f) == key
+    except Exception:
+        return False  # no existe, está corrupta o es de otra versión del código
+
+
+def _write_key(key_path: Path, key: tuple) -> None:
+    tmp_path = key_path.with_suffix(".tmp")
+    with tmp_path.open("wb") as f:
+        pickle.dump(key, f, protocol=pickle.HIGHEST_PROTOCOL)
+    tmp_path.replace(key_path)
+
+
+def _cached_array(name: str, sources: List[Path], builder: Callable[[], np.ndarray]) -> np.ndarray:
+    """
+    Como _cached_load, pero para un array: se guarda con np.save en
+    data/.cache/<name>.npy (la clave en <name>.key) y se abre con mmap,
+    sin parsear nada. El array devuelto es de solo lectura.
+    """
+    key = _cache_key(sources)
+    array_path = CACHE_DIR / f"{name}.npy"
+    key_path = CACHE_DIR / f"{name}.key"
+
+    if _key_matches(key_path, key):
+        try:
+            return np.asarray(np.load(array_path, mmap_mode="r"))
+        except Exception:
+            pass
+
+    result = builder()
+    try:
+        CACHE_DIR.mkdir(exist_ok=True)
+        tmp_path = array_path.with_suffix(".tmp.npy")
+        np.save(tmp_path, result)
+        tmp_path.replace(array_path)
+        _write_key(key_path, key)
+    except OSError:
+        pass  # sin permisos de escritura: se trabaja sin caché
+
+    return result
+
+
+def _disk_cached(name: str, *source_files: str, array: bool = False):
+    """
+    Decorador que aplica _cached_load (o _cached_array si array=True) a un
+    loader sin argumentos. Además memoriza el resultado en el proceso:
+    las llamadas siguientes devuelven el mismo objeto, que no debe modificarse.
+    """
+    sources = [DATA_DIR / s for s in source_files]
+    cached = _cached_array if array else _cached_load
+
+    def decorator(loader):
+        @lru_cache(maxsize=1)
+        @wraps(loader)
+        def wrapper():
+            return cached(name, sources, loader)
+        return wrapper
+
+    return decorator
 
 
-def load_types() -> Dict[int, str]:
+def _types_by_csv_id() -> Dict[int, str]:
     """
     Lee types.csv y devuelve un diccionario:
-    id_tipo (int) -> nombre_tipo (str), por ejemplo: 10 -> 'fire'
+    id_tipo de veekun (int) -> nombre_tipo (str), por ejemplo: 10 -> 'fire'
     """
     types_path = DATA_DIR / "types.csv"
-    id_to_name: Dict[int, str] = {}
+    return {
+        int(type_id): identifier.lower()
+        for type_id, identifier in _read_columns(types_path, "id", "identifier")
+    }
 
-    with types_path.open(encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            type_id = int(row["id"])
-            identifier = row["identifier"].lower()
-            id_to_name[type_id] = identifier
 
-    return id_to_name
+@_disk_cached("types", "types.csv")
+def load_types() -> Tuple[Tuple[str, ...], Dict[str, int]]:
+    """
+    Devuelve (names, name_to_id). Internamente cada tipo es un entero
+    0..n-1 (orden alfabético): names[i] es su nombre para mostrarlo y
+    name_to_id['fire'] su id. Ese id es también su fila/columna en
+    TypeChart.matrix. Con la caché al día no se lee types.csv.
+    """
+    names = tuple(sorted(_types_by_csv_id().values()))
+    return names, {name: i for i, name in enumerate(names)}
+
+
+# Tipos como enteros en todo el programa; los nombres solo para mostrarlos
+TYPE_NAMES, TYPE_IDS = load_types()
+
+
+def _csv_type_ids() -> Dict[int, int]:
+    """
+    id_tipo de veekun -> id interno del tipo (ver load_types).
+    """
+    return {csv_id: TYPE_IDS[name] for csv_id, name in _types_by_csv_id().items()}
+
+
+# Id de relleno para "sin tipo" (segundo tipo vacío, ataque sin tipo): x1
+NO_TYPE = len(TYPE_NAMES)
+
 
+@dataclass
+class TypeChart:
+    """
+    Tabla de tipos precalculada como matriz densa:
+    matrix[id_atacante, id_defensor] = multiplicador (ids de load_types)
+
+    Como la tabla no cambia una vez cargada, se precalculan también todas
+    las combinaciones de dos defensores (NO_TYPE rellena el hueco):
+    pairs[a, d1, d2] = matrix[a, d1] * matrix[a, d2]
+    advantage[a, d1, d2] = pairs[a, d1, d2] > 1
+    dual_advantage[a1, a2, d1, d2] = advantage[a1, d1, d2] or advantage[a2, d1, d2]
+    (si algún tipo de un Pokémon a1/a2 hace más de x1 contra otro d1/d2)
+    """
+    matrix: np.ndarray  # (n_tipos, n_tipos), float32
+    pairs: np.ndarray = field(init=False, repr=False)      # (n+1, n+1, n+1), float32
+    advantage: np.ndarray = field(init=False, repr=False)  # (n+1, n+1, n+1), bool
+    dual_advantage: np.ndarray = field(init=False, repr=False)  # (n+1,) * 4, bool
 
-def load_type_chart() -> Dict[str, Dict[str, float]]:
+    def __post_init__(self):
+        n = len(self.matrix)
+        ext = np.ones((n + 1, n + 1), dtype=np.float32)  # fila/columna NO_TYPE a x1
+        ext[:n, :n] = self.matrix
+        self.pairs = ext[:, :, None] * ext[:, None, :]
+        self.advantage = self.pairs > 1.0
+        self.dual_advantage = self.advantage[:, None] | self.advantage[None, :]
+
+
+def type_pair(types: Sequence[int]) -> Tuple[int, int]:
     """
-    Lee type_efficacy.csv y construye:
-    chart[attacking_type][defending_type] = multiplicador (0, 0.5, 1, 2, 4, ...)
+    Los 0-2 ids de tipo de un Pokémon como pareja, rellenando con NO_TYPE
+    (para indexar TypeChart.pairs / advantage / dual_advantage).
     """
-    types_by_id = load_types()
-    chart: Dict[str, Dict[str, float]] = {}
+    return (tuple(types) + (NO_TYPE, NO_TYPE))[:2]
+
+
+@_disk_cached("type_chart", "types.csv", "type_efficacy.csv", array=True)
+def _type_matrix() -> np.ndarray:
+    """
+    Lee type_efficacy.csv y construye la matriz de efectividades.
+    Las combinaciones sin dato quedan a 1.0 (neutral).
+    """
+    csv_to_type = _csv_type_ids()
+    n = len(TYPE_NAMES)
+    mat = np.ones((n, n), dtype=np.float32)
 
     efficacy_path = DATA_DIR / "type_efficacy.csv"
-    with efficacy_path.open(encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            atk_id = int(row["damage_type_id"])
-            def_id = int(row["target_type_id"])
-            factor = int(row["damage_factor"])  # 0, 50, 100, 200, etc.
+    rows = np.array(
+        list(_read_columns(efficacy_path, "damage_type_id", "target_type_id", "damage_factor")),
+        dtype=np.int64,
+    ).reshape(-1, 3)
+    atk_ids, def_ids, factors = rows.T  # factor: 0, 50, 100, 200, etc.
 
-            atk_name = types_by_id.get(atk_id)
-            def_name = types_by_id.get(def_id)
-            if atk_name is None or def_name is None:
-                continue
+    # id de veekun -> id interno, -1 si el id no está en types.csv
+    known_ids = np.array(sorted(csv_to_type), dtype=np.int64)
+    known_idx = np.array([csv_to_type[t] for t in known_ids], dtype=np.int64)
 
-            multiplier = factor / 100.0  # 200 -> 2.0, 50 -> 0.5, 0 -> 0.0
-            chart.setdefault(atk_name, {})[def_name] = multiplier
+    def to_idx(ids: np.ndarray) -> np.ndarray:
+        pos = np.searchsorted(known_ids, ids).clip(max=len(known_ids) - 1)
+        return np.where(known_ids[pos] == ids, known_idx[pos], -1)
 
-    return chart
+    atk_idx, def_idx = to_idx(atk_ids), to_idx(def_ids)
+    valid = (atk_idx >= 0) & (def_idx >= 0)
+    # 200 -> 2.0, 50 -> 0.5, 0 -> 0.0
+    mat[atk_idx[valid], def_idx[valid]] = factors[valid] / 100.0
 
+    return mat
 
-def effectiveness(attacking: str, defending_types: List[str], chart: Dict[str, Dict[str, float]]) -> float:
+
+@lru_cache(maxsize=1)
+def load_type_chart() -> TypeChart:
     """
-    Devuelve el multiplicador total de un ataque de tipo `attacking`
-    contra un Pokémon con tipos `defending_types` (1 o 2 tipos).
+    Tabla de tipos; la matriz se lee de la caché en disco con mmap
+    cuando los CSV no han cambiado (ver _cached_array).
     """
-    attacking = attacking.lower()
-    total = 1.0
+    return TypeChart(matrix=_type_matrix())
 
-    for dt in defending_types:
-        dt = dt.lower()
-        mul = chart.get(attacking, {}).get(dt, 1.0)  # por defecto 1.0 si no hay dato
-        total *= mul
 
-    return total
+@dataclass
+class MoveTable:
+    """
+    Movimientos en columnas: index[identifier] da la fila y type_idx / power
+    son arrays paralelos. identifier es el nombre 'oficial' en minúsculas y
+    con guiones, ej: 'water-gun'.
+    """
+    index: Dict[str, int]  # 'water-gun' -> fila
+    type_idx: np.ndarray   # int8, id del tipo (-1 si no está en types.csv)
+    power: np.ndarray      # int16, -1 si el movimiento no tiene poder
 
 
-def load_moves() -> Dict[str, Dict[str, Any]]:
+@_disk_cached("moves", "types.csv", "moves.csv")
+def load_moves() -> MoveTable:
     """
-    Lee moves.csv y devuelve:
-    moves[identifier] = {"name": identifier, "type": tipo_nombre, "power": power_int_o_None}
-    identifier es el nombre 'oficial' en minúsculas y con guiones, ej: 'water-gun'.
+    Lee moves.csv y devuelve la tabla de movimientos en columnas (ver MoveTable).
     """
-    types_by_id = load_types()
+    csv_to_type = _csv_type_ids().get
     moves_path = DATA_DIR / "moves.csv"
-    moves: Dict[str, Dict[str, Any]] = {}
 
-    with moves_path.open(encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            identifier = row["identifier"].lower()  # ej: 'water-gun'
-            type_id = int(row["type_id"])
-            power_raw = row["power"]
+    index: Dict[str, int] = {}
+    type_idx: List[int] = []
+    powers: List[int] = []
 
-            if power_raw in ("", "0", None):
-                power = None
-            else:
-                power = int(power_raw)
+    for identifier, type_id, power_raw in _read_columns(moves_path, "identifier", "type_id", "power"):
+        index[identifier.lower()] = len(type_idx)  # ej: 'water-gun'
+        type_idx.append(csv_to_type(int(type_id), -1))
+        powers.append(-1 if power_raw in ("", "0", None) else int(power_raw))
 
-            move_type = types_by_id.get(type_id)
-            moves[identifier] = {
-                "name": identifier,
-                "type": move_type,
-                "power": power,
-            }
+    return MoveTable(
+        index=index,
+        type_idx=np.array(type_idx, dtype=np.int8),
+        power=np.array(powers, dtype=np.int16),
+    )
 
-    return moves
 
-def load_pokemon() -> Dict[str, Dict[str, Any]]:
+def _parse_pokemon() -> Dict[str, Dict[str, Any]]:
     """
-    Carga la información básica de los Pokémon:
-    pokemon['charizard'] -> {'id': 6, 'name': 'charizard', 'types': ['fire', 'flying']}
+    Lee los CSV con la información básica de los Pokémon:
+    pokemon['charizard'] -> {'id': 6, 'name': 'charizard', 'types': (id_flying, id_fire)}
+    Los tipos son ids de load_types (usar TYPE_NAMES para mostrarlos).
     """
-    types_by_id = load_types()
+    csv_to_type = _csv_type_ids()
 
     # Primero: mapa pokemon_id -> lista de type_id (desde pokemon_types.csv)
     ptypes_path = DATA_DIR / "pokemon_types.csv"
-    pokemon_types_ids: Dict[int, List[int]] = {}
+    pokemon_types_ids: defaultdict[int, List[int]] = defaultdict(list)
 
-    with ptypes_path.open(encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            pid = int(row["pokemon_id"])
-            tid = int(row["type_id"])
-            pokemon_types_ids.setdefault(pid, []).append(tid)
+    for pid, tid in _read_columns(ptypes_path, "pokemon_id", "type_id"):
+        pokemon_types_ids[int(pid)].append(int(tid))
 
     # Segundo: leemos pokemon.csv y armamos el diccionario final
     pokemon_path = DATA_DIR / "pokemon.csv"
     pokemon_db: Dict[str, Dict[str, Any]] = {}
 
-    with pokemon_path.open(encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            pid = int(row["id"])
-            identifier = row["identifier"].lower()  # ej: 'charizard'
-            type_ids = sorted(pokemon_types_ids.get(pid, []))
-            type_names = [types_by_id[tid] for tid in type_ids if tid in types_by_id]
+    for pid, identifier in _read_columns(pokemon_path, "id", "identifier"):
+        pid = int(pid)
+        identifier = identifier.lower()  # ej: 'charizard'
+        type_ids = tuple(sorted(pokemon_types_ids.get(pid, ())))
 
-            pokemon_db[identifier] = {
-                "id": pid,
-                "name": identifier,
-                "types": type_names,
-            }
+        pokemon_db[identifier] = {
+            "id": pid,
+            "name": identifier,
+            "types": tuple(csv_to_type[tid] for tid in type_ids if tid in csv_to_type),
+        }
 
     return pokemon_db
+
+
+class PokemonIndex:
+    """
+    Pokémon en una base SQLite en disco (data/.cache/pokemon.sqlite): cada
+    get() es una consulta por clave primaria, sin cargar la tabla en memoria.
+    Devuelve los mismos dicts que _parse_pokemon.
+    """
+
+    _QUERY = "SELECT id, types FROM pokemon WHERE identifier = ?"
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._con: Optional[sqlite3.Connection] = None
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._con is None:  # se abre en la primera consulta
+            # solo lectura; Streamlit consulta desde varios hilos
+            self._con = sqlite3.connect(
+                f"{self.path.as_uri()}?mode=ro", uri=True, check_same_thread=False
+            )
+        return self._con
+
+    def get(self, identifier: str, default: Any = None) -> Any:
+        row = self._connection().execute(self._QUERY, (identifier,)).fetchone()
+        if row is None:
+            return default
+        pid, types = row
+        return {
+            "id": pid,
+            "name": identifier,
+            "types": tuple(int(t) for t in types.split(",") if t),
+        }
+
+    def __getitem__(self, identifier: str) -> Dict[str, Any]:
+        info = self.get(identifier)
+        if info is None:
+            raise KeyError(identifier)
+        return info
+
+    def __contains__(self, identifier: str) -> bool:
+        return self.get(identifier) is not None
+
+
+POKEMON_SOURCES = ("types.csv", "pokemon_types.csv", "pokemon.csv")
+
+
+def build_pokemon_index() -> Path:
+    """
+    Devuelve la ruta del índice SQLite de Pokémon, regenerándolo a partir
+    de los CSV si han cambiado. Lanza OSError si no se puede escribir.
+    """
+    key = _cache_key([DATA_DIR / s for s in POKEMON_SOURCES])
+    db_path = CACHE_DIR / "pokemon.sqlite"
+    key_path = CACHE_DIR / "pokemon.key"
+    if _key_matches(key_path, key) and db_path.exists():
+        return db_path
+
+    CACHE_DIR.mkdir(exist_ok=True)
+    tmp_path = db_path.with_suffix(".tmp.sqlite")
+    tmp_path.unlink(missing_ok=True)
+    con = sqlite3.connect(tmp_path)
+    try:
+        with con:
+            con.execute(
+                "CREATE TABLE pokemon (identifier TEXT PRIMARY KEY, id INTEGER, types TEXT) WITHOUT ROWID"
+            )
+            con.executemany(
+                "INSERT INTO pokemon VALUES (?, ?, ?)",
+                (
+                    (identifier, info["id"], ",".join(map(str, info["types"])))
+                    for identifier, info in _parse_pokemon().items()
+                ),
+            )
+    finally:
+        con.close()
+    tmp_path.replace(db_path)
+    _write_key(key_path, key)
+    return db_path
+
+
+@lru_cache(maxsize=1)
+def load_pokemon() -> Union[PokemonIndex, Dict[str, Dict[str, Any]]]:
+    """
+    Carga los Pokémon para consultarlos por identifier:
+    load_pokemon().get('charizard') -> {'id': 6, 'name': 'charizard', 'types': (...)}
+    Normalmente es un PokemonIndex sobre SQLite; si no se puede escribir la
+    caché, un diccionario en memoria con la misma interfaz get().
+    """
+    try:
+        return PokemonIndex(build_pokemon_index())
+    except (OSError, sqlite3.Error):
+        return _parse_pokemon()
@@ -1,52 +1,359 @@
 from dataclasses import dataclass, field
-from typing import Callable, Dict, Any, List
+from functools import partial
+from typing import Callable, Dict, Any, List, Optional, Sequence, Tuple, Union
+from types import CodeType, FunctionType
+import ast
+import copy
+import linecache
 
 FactBase = Dict[str, Any]
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Rule:
     name: str
     when: Callable[[FactBase], bool]   # condición
     then: Callable[[FactBase], None]  # acción
     explain: str                       # explicación en texto humano
+    reads: Tuple[str, ...] = ()        # hechos derivados por otras reglas que lee
+    # Hechos que añade o cambia `then` (además de recomendaciones). Tiene
+    # que listarlos todos: con ellos se ordena quién se evalúa antes
+    writes: Tuple[str, ...] = ()
 
 
-@dataclass
+@dataclass(slots=True)
 class InferenceResult:
     facts: FactBase
     fired_rules: List[str] = field(default_factory=list)
     trace: List[str] = field(default_factory=list)
 
 
-def forward_chain(facts: FactBase, rules: List[Rule], max_loops: int = 20) -> InferenceResult:
+@dataclass(frozen=True, slots=True)
+class CompiledRules:
     """
-    Motor de encadenamiento hacia adelante muy simple:
-    - Recorre las reglas
-    - Si la condición es verdadera y la regla aún no se ha disparado, ejecuta la acción
-      y guarda una explicación en la traza.
-    - Repite mientras se disparen reglas nuevas o hasta max_loops.
+    Reglas ordenadas de forma que cada una va detrás de las que escriben
+    los hechos que lee: con ese orden basta normalmente una sola pasada.
+    """
+    rules: Tuple[Rule, ...]
+    run: Callable[[FactBase, int], int]  # ver compile_rules_source
+
+
+# Marca de "hecho ausente" dentro del código generado
+_MISSING = object()
+
+
+def _lambdas_by_line(filename: str) -> Dict[int, List[ast.Lambda]]:
+    """
+    Parsea un fichero fuente y agrupa sus lambdas por número de línea.
+    Relee el fichero si ha cambiado en disco (recargas de módulo).
+    """
+    linecache.checkcache(filename)
+    tree = ast.parse("".join(linecache.getlines(filename)), filename)
+    by_line: Dict[int, List[ast.Lambda]] = {}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Lambda):
+            by_line.setdefault(node.lineno, []).append(node)
+    return by_line
+
+
+def _same_code(node: ast.Lambda, code: CodeType) -> bool:
+    """
+    True si el ast recuperado compila exactamente al código de la lambda
+    (el fuente puede haber cambiado desde que se importó el módulo).
+    """
+    try:
+        expr = compile(ast.unparse(node), code.co_filename, "eval")
+    except (SyntaxError, ValueError):
+        return False
+    compiled = next((c for c in expr.co_consts if isinstance(c, CodeType)), None)
+    return compiled is not None and (
+        compiled.co_code == code.co_code
+        and compiled.co_consts == code.co_consts
+        and compiled.co_names == code.co_names
+        and compiled.co_varnames == code.co_varnames
+    )
+
+
+def _lambda_node(fn: Callable, parsed: Dict[str, Dict[int, List[ast.Lambda]]]) -> Optional[ast.Lambda]:
+    """
+    Devuelve el ast de la lambda `fn` (un solo argumento, sin variables
+    capturadas), o None si no se puede localizar sin ambigüedad o si no
+    corresponde al código que realmente ejecuta `fn`.
+    `parsed` guarda los ficheros ya parseados durante una misma compilación.
+    """
+    code = getattr(fn, "__code__", None)
+    if code is None or code.co_name != "<lambda>" or code.co_freevars:
+        return None
+    try:
+        if code.co_filename not in parsed:
+            parsed[code.co_filename] = _lambdas_by_line(code.co_filename)
+        candidates = parsed[code.co_filename].get(code.co_firstlineno, [])
+    except (OSError, SyntaxError):
+        return None
+    if len(candidates) != 1:
+        return None
+
+    node = candidates[0]
+    args = node.args
+    if (len(args.args) != 1 or args.posonlyargs or args.vararg
+            or args.kwonlyargs or args.kwarg or args.defaults):
+        return None
+    if not _same_code(node, code):
+        return None
+    return node
+
+
+class _InlineFacts(ast.NodeTransformer):
+    """
+    Reescribe el cuerpo de una condición para leer los hechos de variables
+    locales (_v_<clave>) en lugar de hacer f[...] / f.get(...) cada vez.
+    Los hechos ausentes valen _M, así se conserva la semántica de get/in/[].
+    """
+
+    def __init__(self, arg: str):
+        self.arg = arg
+        self.keys = set()
+
+    def _is_facts(self, node) -> bool:
+        return isinstance(node, ast.Name) and node.id == self.arg
+
+    def _key(self, node) -> Optional[str]:
+        if isinstance(node, ast.Constant) and isinstance(node.value, str) and node.value.isidentifier():
+            self.keys.add(node.value)
+            return node.value
+        return None
+
+    @staticmethod
+    def _local(key: str) -> ast.Name:
+        return ast.Name(id=f"_v_{key}", ctx=ast.Load())
+
+    @staticmethod
+    def _missing(key: str, negate: bool = False) -> ast.Compare:
+        op = ast.IsNot() if negate else ast.Is()
+        return ast.Compare(left=_InlineFacts._local(key), ops=[op],
+                           comparators=[ast.Name(id="_M", ctx=ast.Load())])
+
+    def visit_Name(self, node):
+        if node.id == self.arg:
+            return ast.copy_location(ast.Name(id="_f", ctx=node.ctx), node)
+        return node
+
+    def visit_Subscript(self, node):
+        # f["k"] -> (_f["k"] if _v_k is _M else _v_k)   (KeyError igual que antes)
+        if isinstance(node.ctx, ast.Load) and self._is_facts(node.value):
+            key = self._key(node.slice)
+            if key is not None:
+                fallback = ast.Subscript(value=ast.Name(id="_f", ctx=ast.Load()),
+                                         slice=node.slice, ctx=ast.Load())
+                return ast.IfExp(test=self._missing(key), body=fallback, orelse=self._local(key))
+        return self.generic_visit(node)
+
+    def visit_Call(self, node):
+        # f.get("k"[, default]) -> (default if _v_k is _M else _v_k)
+        func = node.func
+        if (isinstance(func, ast.Attribute) and func.attr == "get" and self._is_facts(func.value)
+                and 1 <= len(node.args) <= 2 and not node.keywords):
+            key = self._key(node.args[0])
+            if key is not None:
+                default = self.visit(node.args[1]) if len(node.args) == 2 else ast.Constant(value=None)
+                return ast.IfExp(test=self._missing(key), body=default, orelse=self._local(key))
+        return self.generic_visit(node)
+
+    def visit_Compare(self, node):
+        # "k" in f -> _v_k is not _M   /   "k" not in f -> _v_k is _M
+        if (len(node.ops) == 1 and isinstance(node.ops[0], (ast.In, ast.NotIn))
+                and self._is_facts(node.comparators[0])):
+            key = self._key(node.left)
+            if key is not None:
+                return self._missing(key, negate=isinstance(node.ops[0], ast.In))
+        return self.generic_visit(node)
+
+
+def compile_rules_source(rules: Tuple[Rule, ...]) -> Callable[[FactBase, int], int]:
+    """
+    Genera con exec() una única función run(facts, done) que evalúa en orden
+    las condiciones (ya ordenadas por dependencias) de las reglas que no
+    están en la máscara `done`, ejecuta las acciones de las que se cumplen y
+    devuelve una máscara de bits con las reglas disparadas en esta pasada
+    (bit i = regla en la posición i de `rules`).
+    Los hechos se leen a variables locales al empezar y se releen todos
+    cada vez que se dispara una regla. Las condiciones cuyo código fuente
+    no se puede recuperar, o no coincide con el de la lambda (fichero
+    editado sin recargar), se llaman como lambda normal.
     """
-    fired = set()
+    module_globals: Optional[Dict[str, Any]] = None  # globals de las lambdas que se integran
+    keys = set()
+    body: List[Optional[str]] = []
+    parsed: Dict[str, Dict[int, List[ast.Lambda]]] = {}
+
+    for i, r in enumerate(rules):
+        node = _lambda_node(r.when, parsed)
+        if node is not None and module_globals is None:
+            module_globals = r.when.__globals__
+        if node is not None and r.when.__globals__ is module_globals:
+            inliner = _InlineFacts(node.args.args[0].arg)
+            cond = ast.unparse(inliner.visit(copy.deepcopy(node.body)))
+            keys |= inliner.keys
+        else:
+            cond = f"_when[{i}](_f)"
+
+        body.append(f"        if not _done & {1 << i} and ({cond}):")
+        body.append(f"            _then[{i}](_f)")
+        body.append(f"            _fired |= {1 << i}")
+        body.append(None)  # relectura de los hechos, ver más abajo
+
+    # Una acción puede escribir hechos que no declara en `writes`: tras
+    # cada disparo se releen todos (las reglas se disparan pocas veces)
+    load = [f"_v_{key} = _f.get({key!r}, _M)" for key in sorted(keys)]
+    src = [
+        "def _make(_when, _then, _M):",
+        "    def _run(_f, _done):",
+        *("        " + line for line in load),
+        "        _fired = 0",
+    ]
+    for line in body:
+        src.extend(["            " + l for l in load] if line is None else [line])
+    src += ["        return _fired", "    return _run"]
+
+    # _make (y con ella _run) usa los globals vivos del módulo de las
+    # lambdas, no una copia: así ven también lo que se defina después
+    namespace: Dict[str, Any] = {}
+    exec(compile("\n".join(src), "<reglas compiladas>", "exec"), namespace)
+    make = FunctionType(namespace["_make"].__code__,
+                        module_globals if module_globals is not None else namespace)
+    return make(
+        tuple(r.when for r in rules),
+        tuple(r.then for r in rules),
+        _MISSING,
+    )
+
+
+# Resultados ya calculados por tupla de reglas: id -> (tupla, resultado).
+# Se guarda la tupla para que su id no pueda reutilizarse
+_ORDERED: Dict[int, Tuple[Tuple[Rule, ...], Tuple[Rule, ...]]] = {}
+_COMPILED: Dict[int, Tuple[Tuple[Rule, ...], CompiledRules]] = {}
+
+
+def _per_tuple(cache: Dict[int, Tuple[Any, Any]], rules: Sequence[Rule], build: Callable):
+    """
+    build(rules), memorizado si `rules` es una tupla (las listas pueden
+    cambiar después, así que se recalculan).
+    """
+    if not isinstance(rules, tuple):
+        return build(rules)
+    hit = cache.get(id(rules))
+    if hit is None:
+        hit = cache[id(rules)] = (rules, build(rules))
+    return hit[1]
+
+
+def order_rules(rules: Sequence[Rule]) -> Tuple[Rule, ...]:
+    """
+    Ordena topológicamente las reglas según sus `reads`/`writes`,
+    respetando el orden original cuando no hay dependencias entre ellas.
+    """
+    return _per_tuple(_ORDERED, rules, _order_rules)
+
+
+def _order_rules(rules: Sequence[Rule]) -> Tuple[Rule, ...]:
+    writers: Dict[str, List[str]] = {}
+    for r in rules:
+        for key in r.writes:
+            writers.setdefault(key, []).append(r.name)
+
+    pending = list(rules)
+    placed = set()
+    ordered: List[Rule] = []
+
+    while pending:
+        for i, r in enumerate(pending):
+            deps = {w for key in r.reads for w in writers.get(key, ()) if w != r.name}
+            if deps <= placed:
+                break
+        else:
+            names = ", ".join(r.name for r in pending)
+            raise ValueError(f"Dependencia circular entre las reglas: {names}")
+
+        ordered.append(pending.pop(i))
+        placed.add(r.name)
+
+    return tuple(ordered)
+
+
+def _compile_rules(rules: Sequence[Rule]) -> CompiledRules:
+    ordered = order_rules(rules)
+    return CompiledRules(rules=ordered, run=compile_rules_source(ordered))
+
+
+def compile_rules(rules: Sequence[Rule]) -> CompiledRules:
+    """
+    Ordena las reglas (order_rules) y genera su función de evaluación
+    (compile_rules_source). Generarla cuesta milisegundos, así que solo
+    compensa si se van a hacer muchas inferencias; se hace una vez por tupla.
+    """
+    return _per_tuple(_COMPILED, rules, _compile_rules)
+
+
+def _run_interpreted(rules: Tuple[Rule, ...], facts: FactBase, done: int) -> int:
+    """
+    Mismo contrato que la función generada por compile_rules_source, pero
+    llamando directamente a r.when / r.then. Sirve de referencia.
+    """
+    fired = 0
+    for i, r in enumerate(rules):
+        if not done & 1 << i and r.when(facts):
+            r.then(facts)
+            fired |= 1 << i
+    return fired
+
+
+def _chain(run: Callable[[FactBase, int], int], rules: Tuple[Rule, ...],
+           facts: FactBase, max_loops: int) -> Tuple[List[str], List[str]]:
+    """
+    Repite pasadas de `run` hasta que no se dispare nada nuevo.
+    Devuelve (reglas disparadas, traza) en orden de disparo.
+    """
+    fired: List[str] = []
     trace: List[str] = []
 
+    done = 0
     for _ in range(max_loops):
-        fired_any = False
-
-        for r in rules:
-            if r.name in fired:
-                continue
-            if r.when(facts):
-                r.then(facts)
-                fired.add(r.name)
-                fired_any = True
+        new = run(facts, done)
+        if not new:
+            break
+        done |= new
+        for i, r in enumerate(rules):
+            if new >> i & 1:
+                fired.append(r.name)
                 trace.append(f"[{r.name}] {r.explain}")
 
-        if not fired_any:
-            break
+    return fired, trace
+
+
+def forward_chain(facts: FactBase, rules: Union[Sequence[Rule], CompiledRules],
+                  max_loops: int = 20) -> InferenceResult:
+    """
+    Motor de encadenamiento hacia adelante muy simple:
+    - Recorre las reglas en orden de dependencias (ver compile_rules)
+    - Si la condición es verdadera y la regla aún no se ha disparado, ejecuta
+      la acción y guarda una explicación en la traza.
+    - Repite mientras se disparen reglas nuevas o hasta max_loops.
+    Con reads/writes bien declarados basta la primera pasada (la segunda no
+    dispara nada). Si una acción cambia un hecho que no está en su `writes`,
+    lo ven las reglas posteriores y las pasadas siguientes, pero una regla
+    que ya se disparó con el valor anterior no se deshace.
+    """
+    if isinstance(rules, CompiledRules):
+        ordered, run = rules.rules, rules.run
+    else:
+        # Sin generar código: para pocas inferencias no compensa (ver compile_rules)
+        ordered = order_rules(rules)
+        run = partial(_run_interpreted, ordered)
+
+    fired, trace = _chain(run, ordered, facts, max_loops)
 
     return InferenceResult(
         facts=facts,
-        fired_rules=list(fired),
+        fired_rules=fired,
         trace=trace
     )
@@ -0,0 +1,62 @@
+"""
+Compilación por adelantado (numba.pycc) del núcleo de puntuación de
+scoring._score_moves_kernel, el mismo que usa la app con @njit. La
+ventaja de tipos no lo necesita: es una lectura de TypeChart.dual_advantage.
+
+`python src/kernels.py` genera el módulo de extensión `kernels_aot`
+junto a este fichero. main lo usa si existe: así el CLI no paga ni la
+importación de numba ni la compilación JIT en cada arranque. Sin él, main
+hace las mismas cuentas con NumPy.
+
+Hay que volver a generarlo cada vez que cambien scoring.py, STAB_BONUS o
+este fichero: kernels_aot guarda source_hash() del momento de compilarlo
+y main lo descarta (con un aviso) si ya no coincide.
+"""
+
+import zlib
+from pathlib import Path
+
+from kb import STAB_BONUS
+
+_HERE = Path(__file__).resolve().parent
+
+# Firma exportada: (tipos de los movimientos, tipos del rival (k, d),
+# potencias, tipos propios (k, d), matriz de tipos) -> (eff, scores)
+SCORE_MOVES_SIG = (
+    "Tuple((f4[:, ::1], f8[:, ::1]))"
+    "(i4[::1], i4[:, ::1], f4[::1], i4[:, ::1], f4[:, ::1])"
+)
+
+
+def source_hash() -> int:
+    """
+    Huella de todo lo que entra en kernels_aot (sin importar numba).
+    """
+    h = zlib.crc32(repr(STAB_BONUS).encode())
+    for name in ("scoring.py", "kernels.py"):
+        h = zlib.crc32((_HERE / name).read_bytes(), h)
+    return h
+
+
+def build_aot():
+    """
+    Compila el núcleo en src/kernels_aot (requiere numba).
+    """
+    from numba.pycc import CC
+
+    from scoring import _score_moves_kernel
+
+    built = source_hash()
+
+    def _source_hash():
+        return built
+
+    cc = CC("kernels_aot")
+    cc.output_dir = str(_HERE)
+    cc.export("score_moves", SCORE_MOVES_SIG)(_score_moves_kernel)
+    cc.export("source_hash", "i8()")(_source_hash)
+    cc.compile()
+
+
+if __name__ == "__main__":
+    build_aot()
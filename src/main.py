@@ -1,17 +1,67 @@
-from data_loader import load_type_chart, effectiveness, load_moves, load_pokemon
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from data_loader import load_type_chart, load_moves, load_pokemon, type_pair, TYPE_NAMES, TYPE_IDS
 from inference import forward_chain
-from kb import rules
+from kb import STAB_BONUS, move_columns, rules, scored_moves
+
+try:  # núcleo compilado por adelantado con `python src/kernels.py`, opcional
+    import kernels_aot
+except ImportError:
+    kernels_aot = None
+else:
+    import kernels
+    if kernels_aot.source_hash() != kernels.source_hash():
+        print("Aviso: kernels_aot está desactualizado, recompílalo con "
+              "`python src/kernels.py`. Se usa NumPy.", file=sys.stderr)
+        kernels_aot = None
+
+
+# Con la entrada redirigida (scripts, pruebas) se lee directamente de stdin
+_INTERACTIVE = sys.stdin.isatty()
+
+
+def _in(prompt: str) -> str:
+    """
+    Como input(), pero sin pasar por readline cuando stdin no es una terminal.
+    Igual que input(), vacía stdout antes de leer: quien dirige el diálogo
+    por una tubería espera a ver la pregunta.
+    """
+    if _INTERACTIVE:
+        return input(prompt)
+    sys.stdout.write(prompt)
+    sys.stdout.flush()
+    line = sys.stdin.readline()
+    if not line:
+        raise EOFError("EOF when reading a line")
+    return line[:-1] if line.endswith("\n") else line
+
+
+def norm(s: str) -> str:
+    """
+    Normaliza lo que escribe el usuario (sin espacios alrededor, en minúsculas).
+    str.lower ya tiene una vía rápida para texto ASCII en CPython.
+    """
+    return s.strip().lower()
 
 
 def ask_types(label: str):
     """
     Pide los tipos de un Pokémon a mano (plan B si no se encuentra en la base).
+    Devuelve sus ids; los nombres que no existen se ignoran.
     """
-    t1 = input(f"Tipo 1 de {label} (ej: fire, water, grass): ").strip().lower()
-    t2 = input(f"Tipo 2 de {label} (vacío si no tiene): ").strip().lower()
-    tipos = [t1] if t1 else []
-    if t2:
-        tipos.append(t2)
+    t1 = norm(_in(f"Tipo 1 de {label} (ej: fire, water, grass): "))
+    t2 = norm(_in(f"Tipo 2 de {label} (vacío si no tiene): "))
+    tipos = []
+    for t in (t1, t2):
+        if not t:
+            continue
+        if t in TYPE_IDS:
+            tipos.append(TYPE_IDS[t])
+        else:
+            print(f"  -> Tipo '{t}' desconocido, se ignora.")
     return tipos
 
 
@@ -20,13 +70,13 @@ def ask_pokemon(label: str, pokemon_db):
     Pregunta el nombre del Pokémon y, si está en la base de datos veekun,
     obtiene automáticamente sus tipos. Si no, pide los tipos manualmente.
     """
-    raw_name = input(f"Nombre de {label} (ej: pikachu, charizard): ").strip().lower()
+    raw_name = norm(_in(f"Nombre de {label} (ej: pikachu, charizard): "))
     identifier = raw_name.replace(" ", "-")  # 'mr mime' -> 'mr-mime' (formato veekun)
 
     info = pokemon_db.get(identifier)
     if info:
         types = info["types"]
-        print(f"  -> Encontrado en la base: tipos = {types}")
+        print(f"  -> Encontrado en la base: tipos = {[TYPE_NAMES[t] for t in types]}")
         return identifier, types
     else:
         print("  -> No se ha encontrado en la base, introduce los tipos manualmente.")
@@ -34,26 +84,27 @@ def ask_pokemon(label: str, pokemon_db):
         return identifier, types
 
 
-def has_type_advantage(attacking_types, defending_types, chart) -> bool:
+def both_advantages(my_types, enemy_types, chart):
     """
-    Devuelve True si alguno de tus tipos hace más de x1 contra la combinación del rival.
+    Devuelve (my_advantage, enemy_advantage): si alguno de los tipos de un
+    lado hace más de x1 contra la combinación del otro.
+    Cada dirección es una lectura de la tabla precalculada chart.dual_advantage.
     """
-    best = 1.0
-    for t in attacking_types:
-        eff = effectiveness(t, defending_types, chart)
-        if eff > best:
-            best = eff
-    return best > 1.0   # ventaja si hay algún ataque > x1
+    my_pair = type_pair(my_types)
+    enemy_pair = type_pair(enemy_types)
+    adv = chart.dual_advantage
+    return bool(adv[my_pair + enemy_pair]), bool(adv[enemy_pair + my_pair])
 
 
-def ask_moves(moves_db, my_types, enemy_types, chart):
+def ask_moves(moves_db, my_idx, enemy_idx, E):
     """
     Pregunta hasta 4 movimientos.
     - Intenta buscarlos en la base veekun por identifier (con guiones).
     - Si no los encuentra, pide tipo y poder manualmente.
     Calcula y añade: tipo, poder, efectividad y score.
+    Devuelve (movimientos, los mismos en columnas para el motor de reglas).
     """
-    my_moves = []
+    collected = []
     print("\nIntroduce hasta 4 movimientos. Ejemplos de nombres válidos (formato veekun):")
     print("  water gun -> water-gun")
     print("  flamethrower -> flamethrower")
@@ -61,75 +112,95 @@ def ask_moves(moves_db, my_types, enemy_types, chart):
     print("Deja vacío el nombre para terminar.\n")
 
     for i in range(4):
-        raw_name = input(f"Nombre del movimiento {i+1}: ").strip()
+        raw_name = _in(f"Nombre del movimiento {i+1}: ").strip()
         if not raw_name:
             break
 
         key = raw_name.lower().replace(" ", "-")
-        db_mv = moves_db.get(key)
-
-        if db_mv:
-            mv_type = db_mv["type"]
-            power = db_mv["power"] if db_mv["power"] is not None else 60
-            print(f"  -> Encontrado en base: tipo={mv_type}, poder={power}")
+        row = moves_db.index.get(key)
+
+        if row is not None:
+            mv_type = int(moves_db.type_idx[row])  # -1 si es desconocido
+            power = int(moves_db.power[row])
+            power = 60 if power < 0 else power
+            type_name = TYPE_NAMES[mv_type] if mv_type >= 0 else None
+            print(f"  -> Encontrado en base: tipo={type_name}, poder={power}")
         else:
             print("  -> No encontrado en la base. Te pido datos manuales.")
-            mv_type = input("     Tipo del movimiento: ").strip().lower()
-            power = float(input("     Poder aproximado (ej 40, 60, 90): "))
-
-        eff = effectiveness(mv_type, enemy_types, chart)
-        score = eff * power
-        if mv_type in my_types:
-            score *= 1.2  # pequeño bonus por STAB
-
-        my_moves.append({
-            "name": raw_name,      # nombre tal cual lo escribe el usuario
-            "identifier": key,     # nombre en formato veekun (con guiones)
-            "type": mv_type,
-            "power": power,
-            "eff": eff,
-            "score": score,
-        })
+            type_name = norm(_in("     Tipo del movimiento: "))
+            mv_type = TYPE_IDS.get(type_name, -1)  # desconocido -> neutral
+            # vacío -> 60, igual que los movimientos de la base sin poder
+            power = np.float32(_in("     Poder aproximado (ej 40, 60, 90): ").strip() or "60")
+
+        collected.append((raw_name, key, mv_type, power))
+
+    if not collected:
+        return [], None
+
+    # Puntuación de todos los movimientos de una vez sobre la matriz de tipos
+    types_idx, powers = move_columns(collected)
+
+    if kernels_aot is not None:
+        # un solo emparejamiento: filas (1, 2) de tipos rellenas con -1
+        rows = np.full((2, 2), -1, dtype=np.int32)
+        rows[0, :len(enemy_idx)] = enemy_idx
+        rows[1, :len(my_idx)] = my_idx
+        eff, score = kernels_aot.score_moves(types_idx, rows[:1], powers, rows[1:], E)
+        eff, score = eff[0], score[0]
+    else:
+        eff = E[types_idx.clip(min=0)][:, enemy_idx].prod(axis=1)
+        eff[types_idx < 0] = 1.0  # tipo desconocido: neutral
+        stab = np.where(np.isin(types_idx, my_idx), STAB_BONUS, 1.0)  # pequeño bonus por STAB
+        score = eff * powers * stab
 
-    return my_moves
+    return scored_moves(collected, eff, score)
 
 
 def main():
-    # Cargar bases de datos
-    chart = load_type_chart()
-    moves_db = load_moves()
-    pokemon_db = load_pokemon()
+    # Cargar bases de datos (a la vez: leen ficheros distintos)
+    with ThreadPoolExecutor(max_workers=3) as ex:
+        f_chart = ex.submit(load_type_chart)
+        f_moves = ex.submit(load_moves)
+        f_pokemon = ex.submit(load_pokemon)
+    chart = f_chart.result()
+    E = chart.matrix  # E[atacante, defensor], indexada por id de tipo
+    moves_db = f_moves.result()
+    pokemon_db = f_pokemon.result()
 
     print("=== Sistema Experto Pokémon (v0.4) ===\n")
 
     # Datos básicos: nombres + tipos automáticos
     my_name, my_types = ask_pokemon("TU Pokémon", pokemon_db)
     enemy_name, enemy_types = ask_pokemon("POKÉMON ENEMIGO", pokemon_db)
+    # ids de tipo como arrays, una sola vez para puntuar los movimientos
+    my_idx = np.array(my_types, dtype=np.int64)
+    enemy_idx = np.array(enemy_types, dtype=np.int64)
 
-    my_hp_pct = float(input("Tu vida actual (%) 0-100: "))
-    enemy_hp_pct = float(input("Vida actual del enemigo (%) 0-100: "))
+    my_hp_pct = float(_in("Tu vida actual (%) 0-100: "))
+    enemy_hp_pct = float(_in("Vida actual del enemigo (%) 0-100: "))
 
     # Movimientos
-    my_moves = ask_moves(moves_db, my_types, enemy_types, chart)
+    my_moves, my_moves_soa = ask_moves(moves_db, my_idx, enemy_idx, E)
 
     # Hechos adicionales: prioridad, defensa y velocidad
-    has_priority_move = input(
+    has_priority_move = norm(_in(
         "\n¿Tienes algún movimiento de prioridad (ej: quick attack, extremespeed)? (s/n): "
-    ).strip().lower() == "s"
+    )) == "s"
 
-    has_defensive_move = input(
+    has_defensive_move = norm(_in(
         "¿Tienes movimiento defensivo / de curación útil este turno? (s/n): "
-    ).strip().lower() == "s"
+    )) == "s"
 
-    speed_info = input(
+    speed_info = norm(_in(
         "En general, ¿tu Pokémon es más rápido que el rival? (rapido/lento/no se): "
-    ).strip().lower()
+    ))
     is_faster = speed_info == "rapido"
     is_slower = speed_info == "lento"
 
-    # Ventaja aproximada de tipos
-    my_advantage = has_type_advantage(my_types, enemy_types, chart)
-    enemy_advantage = has_type_advantage(enemy_types, my_types, chart)
+    # Ventaja aproximada de tipos. Sin memoizar: dual_advantage ya es la
+    # tabla precalculada de todas las combinaciones y cada ejecución
+    # consulta un único emparejamiento
+    my_advantage, enemy_advantage = both_advantages(my_types, enemy_types, chart)
 
     # Base de hechos
     facts = {
@@ -142,32 +213,34 @@ def main():
         "my_advantage": my_advantage,
         "enemy_advantage": enemy_advantage,
         "my_moves": my_moves,
+        "my_moves_soa": my_moves_soa,
         "has_priority_move": has_priority_move,
         "has_defensive_move": has_defensive_move,
         "is_faster": is_faster,
         "is_slower": is_slower,
     }
 
-    # Motor de inferencia
+    # Motor de inferencia (una sola inferencia: sin compilar las reglas)
     result = forward_chain(facts, rules())
 
-    # Recomendaciones ordenadas por prioridad
-    recos = sorted(result.facts.get("recommendations", []),
-                   key=lambda r: -r["priority"])
+    # Recomendaciones: add_reco ya las deja ordenadas por prioridad
+    recos = result.facts.get("recommendations", [])
 
-    print("\n=== RECOMENDACIONES DEL SISTEMA EXPERTO ===")
+    # Toda la salida final en una sola escritura
+    out = ["", "=== RECOMENDACIONES DEL SISTEMA EXPERTO ==="]
     if not recos:
-        print("No se ha generado ninguna recomendación (todavía pocas reglas).")
+        out.append("No se ha generado ninguna recomendación (todavía pocas reglas).")
     else:
-        for r in recos:
-            print(f"- [{r['priority']}] {r['text']}")
+        out.extend(f"- [{r['priority']}] {r['text']}" for r in recos)
 
-    print("\n=== EXPLICACIÓN (TRAZA DE REGLAS DISPARADAS) ===")
+    out += ["", "=== EXPLICACIÓN (TRAZA DE REGLAS DISPARADAS) ==="]
     if not result.trace:
-        print("Ninguna regla se ha activado.")
+        out.append("Ninguna regla se ha activado.")
     else:
-        for line in result.trace:
-            print(line)
+        out.extend(result.trace)
+
+    sys.stdout.write("\n".join(out) + "\n")
+    sys.stdout.flush()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,71 @@
+"""
+Puntuación numérica de movimientos en lote.
+
+Para un único combate hay muy pocos movimientos, pero si se puntúan muchos
+emparejamientos a la vez (análisis de equipos, etc.) el bucle en Python
+domina. Si numba está instalado el núcleo se compila con @njit; si no,
+se ejecuta la misma función en Python.
+"""
+
+import os
+
+import numpy as np
+
+try:  # compilador JIT, opcional
+    from numba import njit
+except ImportError:
+    njit = None
+
+from kb import STAB_BONUS
+
+
+# Con SE_POKEMON_NO_JIT=1 se evita la compilación inicial (útil en Streamlit)
+NO_JIT = bool(os.environ.get("SE_POKEMON_NO_JIT"))
+
+
+def _score_moves_kernel(mv_type_idx, def_idx, powers, my_type_idx_mask, chart):
+    """
+    mv_type_idx:      int32[m]    tipo de cada movimiento (-1 = desconocido)
+    def_idx:          int32[k, d] tipos del rival por emparejamiento (-1 = hueco)
+    powers:           float32[m]  potencia de cada movimiento
+    my_type_idx_mask: int32[k, d] tipos propios por emparejamiento (-1 = hueco)
+    chart:            float32[n, n] contiguo, chart[atacante, defensor]
+
+    Devuelve (eff, scores), ambos de forma (k, m).
+    """
+    k = def_idx.shape[0]
+    m = mv_type_idx.shape[0]
+    eff = np.ones((k, m), dtype=np.float32)
+    scores = np.empty((k, m), dtype=np.float64)
+
+    for b in range(k):
+        for j in range(m):
+            t = mv_type_idx[j]
+            e = np.float32(1.0)
+            stab = 1.0
+            if t >= 0:
+                for d in range(def_idx.shape[1]):
+                    dt = def_idx[b, d]
+                    if dt >= 0:
+                        e *= chart[t, dt]
+                for d in range(my_type_idx_mask.shape[1]):
+                    if my_type_idx_mask[b, d] == t:
+                        stab = STAB_BONUS
+            eff[b, j] = e
+            scores[b, j] = e * powers[j] * stab
+
+    return eff, scores
+
+
+if njit is not None and not NO_JIT:
+    score_moves_kernel = njit(cache=True, fastmath=True)(_score_moves_kernel)
+else:
+    score_moves_kernel = _score_moves_kernel
+
+
+def type_rows(type_lists, width: int = 2) -> np.ndarray:
+    """Empaqueta listas de tipos en un array int32 (k, width) relleno con -1."""
+    rows = np.full((len(type_lists), width), -1, dtype=np.int32)
+    for i, types in enumerate(type_lists):
+        rows[i, :len(types)] = types
+    return rows
@@ -0,0 +1,119 @@
+"""
+Pruebas del motor de inferencia: el código que genera compile_rules_source
+tiene que disparar lo mismo que la evaluación directa de las reglas.
+
+Uso: python -m unittest discover tests   (o pytest)
+"""
+
+import ast
+import random
+import sys
+import unittest
+from functools import partial
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+import kb  # noqa: E402
+from inference import (  # noqa: E402
+    Rule, _chain, _run_interpreted, _same_code, compile_rules,
+    forward_chain,
+)
+
+
+def _set_locked(f):
+    f["locked"] = True
+
+
+# La acción escribe un hecho que no declara en `writes`
+UNDECLARED = (
+    Rule(name="A_SET_LOCKED",
+         when=lambda f: f["hp"] < 50,
+         then=_set_locked, explain="a"),
+    Rule(name="B_ONLY_IF_NOT_LOCKED",
+         when=lambda f: not f.get("locked"),
+         then=lambda f: None, explain="b"),
+)
+
+# La condición usa un global que se define después de compilarla
+LATE = (
+    Rule(name="LATE",
+         when=lambda f: f["x"] > LATE_LIMIT,
+         then=lambda f: None, explain="l"),
+)
+
+
+def random_facts(rnd: random.Random):
+    """Una base de hechos aleatoria con la forma de la que arma main."""
+    types = list(range(5))
+    moves = []
+    for i in range(rnd.randint(0, 4)):
+        eff = rnd.choice([0.0, 0.25, 0.5, 1.0, 2.0, 4.0])
+        power = rnd.choice([10, 20, 40, 60, 90, 120])
+        moves.append(kb.Move(name=f"m{i}", identifier=f"m{i}", type=rnd.choice(types),
+                             power=power, eff=eff, score=eff * power))
+    return {
+        "my_pokemon": rnd.choice(["pikachu", "mew", ""]),
+        "enemy_pokemon": rnd.choice(["onix", "eevee"]),
+        "my_types": rnd.sample(types, rnd.randint(0, 2)),
+        "enemy_types": rnd.sample(types, rnd.randint(0, 2)),
+        "my_hp_pct": float(rnd.choice(range(0, 101, 5))),
+        "enemy_hp_pct": float(rnd.choice(range(0, 101, 5))),
+        "my_advantage": rnd.random() < .5,
+        "enemy_advantage": rnd.random() < .5,
+        "my_moves": moves,
+        "has_priority_move": rnd.random() < .5,
+        "has_defensive_move": rnd.random() < .5,
+        "is_faster": rnd.random() < .4,
+        "is_slower": rnd.random() < .4,
+    }
+
+
+class CompiledRulesTest(unittest.TestCase):
+
+    def assert_same_as_interpreted(self, compiled, facts):
+        expected_facts = dict(facts)
+        expected = _chain(partial(_run_interpreted, compiled.rules), compiled.rules,
+                          expected_facts, 20)
+        got = _chain(compiled.run, compiled.rules, facts, 20)
+        self.assertEqual(got, expected)
+        self.assertEqual(facts.get("recommendations"), expected_facts.get("recommendations"))
+
+    def test_kb_matches_interpreted(self):
+        compiled = kb.compiled_rules()
+        rnd = random.Random(1)
+        for _ in range(2000):
+            self.assert_same_as_interpreted(compiled, random_facts(rnd))
+
+    def test_kb_conditions_are_inlined(self):
+        # _when solo se captura si alguna condición se llama como lambda
+        self.assertNotIn("_when", kb.compiled_rules().run.__code__.co_freevars)
+
+    def test_undeclared_write_is_seen_in_the_same_sweep(self):
+        for facts in ({"hp": 10}, {"hp": 90}):
+            self.assert_same_as_interpreted(compile_rules(UNDECLARED), dict(facts))
+        self.assertEqual(forward_chain({"hp": 10}, compile_rules(UNDECLARED)).fired_rules,
+                         ["A_SET_LOCKED"])
+
+    def test_late_global(self):
+        global LATE_LIMIT
+        compiled = compile_rules(LATE)
+        LATE_LIMIT = 1
+        try:
+            self.assertEqual(forward_chain({"x": 5}, compiled).fired_rules, ["LATE"])
+        finally:
+            del LATE_LIMIT
+
+    def test_same_code(self):
+        fn = lambda f: f["hp"] < 50  # noqa: E731
+        self.assertTrue(_same_code(ast.parse('lambda f: f["hp"] < 50', mode="eval").body,
+                                   fn.__code__))
+        self.assertFalse(_same_code(ast.parse('lambda f: f["hp"] < 51', mode="eval").body,
+                                    fn.__code__))
+
+    def test_compiled_once_per_tuple(self):
+        self.assertIs(compile_rules(kb.RULES), kb.compiled_rules())
+
+
+if __name__ == "__main__":
+    unittest.main()